@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+
+"""Measure the startup time of run_dorina
+
+Runs a number of typical command lines against the test data set and prints
+the best and median wall clock time of each."""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from os import path
+
+basedir = path.dirname(path.dirname(path.abspath(__file__)))
+datadir = path.join(basedir, 'test', 'data')
+
+COMMANDS = [
+    ('import dorina.run',  ['-c', 'import dorina.run']),
+    ('--list-genomes',     ['run_dorina', '--list-genomes']),
+    ('--list-regulators',  ['run_dorina', '--list-regulators']),
+    ('invalid regulator',  ['run_dorina', '--genome', 'hg19', '-a', 'invalid']),
+    ('single regulator',   ['run_dorina', '--genome', 'hg19', '-a', 'PARCLIP_scifi']),
+]
+
+
+def time_command(args, configfile, repeat):
+    if args[0] == 'run_dorina':
+        args = [path.join(basedir, 'run_dorina'), '-c', configfile] + args[1:]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([basedir, env.get('PYTHONPATH', '')])
+
+    timings = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.call([sys.executable] + args, stdout=devnull,
+                            stderr=devnull, env=env)
+            timings.append(time.time() - start)
+
+    timings.sort()
+    return timings[0], timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure run_dorina startup time")
+    parser.add_argument('-n', '--repeat', dest='repeat',
+                        type=int, default=10,
+                        help="number of runs per command")
+    options = parser.parse_args()
+
+    fd, configfile = tempfile.mkstemp(suffix='.cfg')
+    with os.fdopen(fd, 'w') as fh:
+        fh.write("[data]\npath=%s\n" % datadir)
+
+    try:
+        print "%-20s %10s %10s" % ("command", "best [ms]", "median [ms]")
+        for name, args in COMMANDS:
+            best, median = time_command(args, configfile, options.repeat)
+            print "%-20s %10.1f %10.1f" % (name, best * 1000, median * 1000)
+    finally:
+        os.unlink(configfile)
+
+
+if __name__ == "__main__":
+    main()
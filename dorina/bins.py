@@ -0,0 +1,138 @@
+# vim: set fileencoding=utf-8 :
+
+import os
+import json
+import hashlib
+import tempfile
+
+from dorina.cache import BedCache
+
+class BinIndex:
+    """Coarse occupancy map of a BED or GFF track
+
+    For every chromosome, a bitset (stored as a Python long) marks the 64 kb
+    bins touched by at least one feature of the track. Two tracks can only
+    overlap if their maps share a set bit, which is cheap to check before any
+    interval is compared."""
+
+    BIN_SHIFT = 16
+    _indexes = {}
+
+    def __init__(self, bins=None):
+        self.bins = bins or {}
+
+    def add(self, chrom, start, end):
+        """Mark the bins covered by the 0-based, half-open interval start-end"""
+        first = start >> self.BIN_SHIFT
+        last = max(end - 1, start) >> self.BIN_SHIFT
+        mask = ((1 << (last - first + 1)) - 1) << first
+        self.bins[chrom] = self.bins.get(chrom, 0) | mask
+
+    def is_empty(self):
+        return not any(self.bins.values())
+
+    def __and__(self, other):
+        bins = {}
+        for chrom, bitset in self.bins.items():
+            common = bitset & other.bins.get(chrom, 0)
+            if common:
+                bins[chrom] = common
+        return BinIndex(bins)
+
+    def __or__(self, other):
+        bins = dict(self.bins)
+        for chrom, bitset in other.bins.items():
+            bins[chrom] = bins.get(chrom, 0) | bitset
+        return BinIndex(bins)
+
+    @classmethod
+    def from_file(klass, filename, gff=False):
+        """Build the occupancy map of a BED file, or a GFF file if <gff> is set"""
+        index = klass()
+        with open(filename, 'r') as fh:
+            for line in fh:
+                if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                    continue
+                fields = line.split('\t')
+                if gff:
+                    start, end = int(fields[3]) - 1, int(fields[4])
+                else:
+                    start, end = int(fields[1]), int(fields[2])
+                index.add(fields[0], start, end)
+        return index
+
+    def to_dict(self):
+        return dict((chrom, '%x' % bitset) for chrom, bitset in self.bins.items())
+
+    @classmethod
+    def from_dict(klass, data):
+        return klass(dict((chrom, long(bitset, 16)) for chrom, bitset in data.items()))
+
+    @staticmethod
+    def sidecar_path(source, key):
+        """Get the name of the sidecar file of map <key> next to <source>"""
+        return "%s.%s.bins" % (source, hashlib.sha1(key).hexdigest())
+
+    @classmethod
+    def stored(klass, key, source, build_func, sidecar=False):
+        """Get the occupancy map <key> of <source>, building it if needed
+
+        Maps are stored persistently, so they are only built once per version
+        of the source: if <sidecar> is set, in a file of their own next to the
+        data track if its directory is writable, otherwise in the BedCache if
+        it is enabled. Without any persistent store, building a map would cost
+        a full pass over the track on every run, so None is returned and
+        callers skip the prefilter."""
+        fingerprint = BedCache.fingerprint([source])
+        memo_key = (key, fingerprint)
+        if memo_key in klass._indexes:
+            return klass._indexes[memo_key]
+
+        index = None
+        if sidecar:
+            index = klass._from_sidecar(klass.sidecar_path(source, key),
+                                        fingerprint, build_func)
+
+        if index is None and BedCache.enabled():
+            def build(tmp_name):
+                with open(tmp_name, 'w') as fh:
+                    json.dump(build_func().to_dict(), fh)
+
+            filename = BedCache.fetch(key, [source], build, suffix='.json')
+            with open(filename, 'r') as fh:
+                index = klass.from_dict(json.load(fh))
+
+        if index is not None:
+            klass._indexes[memo_key] = index
+        return index
+
+    @classmethod
+    def _from_sidecar(klass, sidecar, fingerprint, build_func):
+        """Load a map from its sidecar file, building the file if needed
+
+        Returns None if the sidecar is out of date and can't be written."""
+        try:
+            with open(sidecar, 'r') as fh:
+                data = json.load(fh)
+            if data['fingerprint'] == fingerprint:
+                return klass.from_dict(data['bins'])
+        except (IOError, ValueError, KeyError):
+            pass
+
+        directory = os.path.dirname(sidecar)
+        if not os.access(directory, os.W_OK):
+            return None
+
+        index = build_func()
+        tmp_name = None
+        try:
+            fd, tmp_name = tempfile.mkstemp(suffix='.tmp', dir=directory)
+            with os.fdopen(fd, 'w') as fh:
+                json.dump({'fingerprint': fingerprint, 'bins': index.to_dict()}, fh)
+            os.rename(tmp_name, sidecar)
+        except (IOError, OSError):
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            return None
+
+        return index
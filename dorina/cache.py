@@ -0,0 +1,145 @@
+# vim: set fileencoding=utf-8 :
+
+import os
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+
+class BedCache:
+    """On-disk cache of preprocessed BED/GFF files shared between processes
+
+    Entries are plain files in the cache directory, named after a hash of the
+    entry key and the fingerprint of the source files it was built from. All
+    worker processes pointed at the same directory reuse the same files, and
+    with them the same pages in the OS page cache, instead of each building a
+    private temporary copy. Entries are written to a temporary file and
+    renamed into place, so readers never see partial files.
+
+    The total size of the cache is kept below max_size by evicting the least
+    recently used entries. Entries used within the last grace_period seconds
+    are never evicted, as other processes may still be reading them."""
+
+    DEFAULT_MAX_SIZE = 1024 ** 3
+    DEFAULT_GRACE_PERIOD = 600
+    _cachedir = None
+    _max_size = DEFAULT_MAX_SIZE
+    _grace_period = DEFAULT_GRACE_PERIOD
+
+    @classmethod
+    def init(klass, cachedir, max_size=None, grace_period=None):
+        if not os.path.isdir(cachedir):
+            try:
+                os.makedirs(cachedir)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        klass._cachedir = cachedir
+        klass._max_size = int(max_size) if max_size else klass.DEFAULT_MAX_SIZE
+        if grace_period is None:
+            klass._grace_period = klass.DEFAULT_GRACE_PERIOD
+        else:
+            klass._grace_period = int(grace_period)
+
+    @classmethod
+    def disable(klass):
+        klass._cachedir = None
+
+    @classmethod
+    def enabled(klass):
+        return klass._cachedir is not None
+
+    @staticmethod
+    def fingerprint(sources):
+        """Get a string identifying the current state of the source files"""
+        parts = []
+        for source in sources:
+            stat = os.stat(source)
+            parts.append("%s:%d:%d:%r" % (os.path.abspath(source), stat.st_ino,
+                                          stat.st_size, stat.st_mtime))
+        return "|".join(parts)
+
+    @classmethod
+    def path_for(klass, key, sources, suffix='.bed'):
+        """Get the cache file name for <key> built from <sources>"""
+        digest = hashlib.sha1("%s|%s" % (key, klass.fingerprint(sources))).hexdigest()
+        return os.path.join(klass._cachedir, digest + suffix)
+
+    @classmethod
+    def fetch(klass, key, sources, build_func, suffix='.bed'):
+        """Get the path of the cache entry <key>, building it if needed
+
+        build_func is called with a file name it needs to write the entry to."""
+        filename = klass.path_for(key, sources, suffix)
+
+        if os.path.exists(filename):
+            try:
+                # mtime is used as the access time for LRU eviction, atime is
+                # not reliable on noatime mounts
+                os.utime(filename, None)
+                logging.debug("cache hit for %r: %s" % (key, filename))
+                return filename
+            except OSError:
+                # evicted by another process in the meantime, rebuild it
+                pass
+
+        logging.debug("cache miss for %r, building %s" % (key, filename))
+        fd, tmp_name = tempfile.mkstemp(suffix='.tmp', dir=klass._cachedir)
+        os.close(fd)
+        try:
+            build_func(tmp_name)
+            os.rename(tmp_name, filename)
+        except:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+        klass.evict()
+        return filename
+
+    @classmethod
+    def evict(klass):
+        """Remove least recently used entries until the cache fits max_size
+
+        Temporary files of builds that crashed or were killed are removed once
+        they are older than the grace period."""
+        entries = []
+        total = 0
+        cutoff = time.time() - klass._grace_period
+        for name in os.listdir(klass._cachedir):
+            filename = os.path.join(klass._cachedir, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+
+            if name.endswith('.tmp'):
+                if stat.st_mtime < cutoff:
+                    try:
+                        os.unlink(filename)
+                        logging.debug("removed stale %s from cache" % filename)
+                        continue
+                    except OSError:
+                        pass
+                # builds still in progress count towards the cache size
+                total += stat.st_size
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, filename))
+            total += stat.st_size
+
+        entries.sort()
+        for mtime, size, filename in entries:
+            if total <= klass._max_size:
+                break
+            if mtime > cutoff:
+                break
+            try:
+                os.unlink(filename)
+                logging.debug("evicted %s from cache" % filename)
+            except OSError:
+                # already removed by another process
+                pass
+            total -= size
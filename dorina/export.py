@@ -0,0 +1,162 @@
+# vim: set fileencoding=utf-8 :
+
+"""Export doRiNA analysis results as Apache Arrow data
+
+The result of Dorina.analyse() is a GFF genome feature joined with the BED
+fields of the matching regulator. The functions in this module turn these rows
+into typed Arrow record batches, so consumers don't need to reparse the text.
+pyarrow is an optional dependency and only needed when exporting.
+"""
+
+from itertools import chain
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+DEFAULT_BATCH_SIZE = 65536
+
+# (column name, arrow type name, parser) for the GFF fields of the genome feature
+GENOME_FIELDS = [
+    ('genome_seqid',      'string',  str),
+    ('genome_source',     'string',  str),
+    ('genome_type',       'string',  str),
+    ('genome_start',      'int64',   int),
+    ('genome_end',        'int64',   int),
+    ('genome_score',      'float64', float),
+    ('genome_strand',     'string',  str),
+    ('genome_phase',      'int8',    int),
+    ('genome_attributes', 'string',  str),
+]
+
+# (column name, arrow type name, parser) for the BED6 fields of the regulator
+REGULATOR_FIELDS = [
+    ('regulator_chrom',  'string',  str),
+    ('regulator_start',  'int64',   int),
+    ('regulator_end',    'int64',   int),
+    ('regulator_name',   'string',  str),
+    ('regulator_score',  'float64', float),
+    ('regulator_strand', 'string',  str),
+]
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Exporting to Arrow requires pyarrow, "
+                          "install it with 'pip install dorina[arrow]'")
+
+
+def _fields_for_width(width):
+    """Get the column definitions for a result row with <width> fields"""
+    num_regulator_fields = width - len(GENOME_FIELDS)
+    if num_regulator_fields < 3 or num_regulator_fields > len(REGULATOR_FIELDS):
+        raise ValueError("Unexpected number of fields in result: %d" % width)
+    return GENOME_FIELDS + REGULATOR_FIELDS[:num_regulator_fields]
+
+
+def _parse(value, parser):
+    """Parse a single field, mapping the '.' placeholder to null"""
+    if value == '.' or value == '':
+        return None
+    return parser(value)
+
+
+def schema(width=None):
+    """Get the Arrow schema for result rows with <width> fields
+
+    Without a width, the schema for a GFF feature joined with a BED6 regulator
+    is returned."""
+    _require_pyarrow()
+    if width is None:
+        fields = GENOME_FIELDS + REGULATOR_FIELDS
+    else:
+        fields = _fields_for_width(width)
+    return pa.schema([pa.field(name, getattr(pa, type_name)())
+                      for name, type_name, _ in fields])
+
+
+def _make_batch(columns, result_schema):
+    arrays = [pa.array(column, type=field.type)
+              for column, field in zip(columns, result_schema)]
+    return pa.RecordBatch.from_arrays(arrays, [field.name for field in result_schema])
+
+
+def record_batches(result, batch_size=DEFAULT_BATCH_SIZE):
+    """Turn a result BedTool into a stream of Arrow record batches
+
+    Returns a (schema, iterator) tuple. Rows are parsed as they are read, so
+    at most <batch_size> rows are held in Python lists at any time."""
+    _require_pyarrow()
+
+    features = iter(result)
+    try:
+        first = next(features)
+    except StopIteration:
+        return schema(), iter([])
+
+    width = len(first.fields)
+    fields = _fields_for_width(width)
+    result_schema = schema(width)
+
+    def generate():
+        columns = [[] for _ in fields]
+        rows = 0
+        for feature in chain([first], features):
+            values = feature.fields
+            if len(values) != width:
+                raise ValueError("Inconsistent number of fields in result: "
+                                 "expected %d, got %d" % (width, len(values)))
+            for column, value, (_, _, parser) in zip(columns, values, fields):
+                column.append(_parse(value, parser))
+            rows += 1
+            if rows == batch_size:
+                yield _make_batch(columns, result_schema)
+                columns = [[] for _ in fields]
+                rows = 0
+        if rows:
+            yield _make_batch(columns, result_schema)
+
+    return result_schema, generate()
+
+
+def to_arrow(result, batch_size=DEFAULT_BATCH_SIZE):
+    """Convert a result BedTool into an Arrow table
+
+    The table's buffers are owned by Arrow, so in-process consumers (pandas,
+    polars, DuckDB, ...) can use it without any further copies."""
+    result_schema, batches = record_batches(result, batch_size)
+    return pa.Table.from_batches(list(batches), schema=result_schema)
+
+
+def write_parquet(result, filename, batch_size=DEFAULT_BATCH_SIZE):
+    """Write a result BedTool to a Parquet file, one row group per batch"""
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    result_schema, batches = record_batches(result, batch_size)
+    writer = pq.ParquetWriter(filename, result_schema)
+    try:
+        for batch in batches:
+            writer.write_table(pa.Table.from_batches([batch], schema=result_schema))
+    finally:
+        writer.close()
+
+
+def write_arrow(result, filename, batch_size=DEFAULT_BATCH_SIZE):
+    """Write a result BedTool to an Arrow IPC file, batch by batch
+
+    This is the Arrow IPC file format, which pyarrow >= 0.17 also reads as
+    Feather V2. The pyarrow releases available on Python 2 read it with
+    pyarrow.ipc.open_file(), not as Feather."""
+    _require_pyarrow()
+
+    result_schema, batches = record_batches(result, batch_size)
+    sink = pa.OSFile(filename, 'wb')
+    try:
+        writer = pa.RecordBatchFileWriter(sink, result_schema)
+        for batch in batches:
+            writer.write_batch(batch)
+        writer.close()
+    finally:
+        sink.close()
@@ -8,7 +8,7 @@ class Genome:
     _genomes = None
 
     @classmethod
-    def init(klass, datadir):
+    def init(klass, datadir, assembly=None):
         def parse_func(root):
             """Parse function used to initialise all genomes from the data directory."""
 
@@ -27,7 +27,7 @@ class Genome:
 
         klass._datadir = datadir
         klass._genomes = DorinaUtils.walk_assembly_tree(os.path.join(datadir, 'genomes'),
-                                                        parse_func)
+                                                        parse_func, assembly)
 
     @classmethod
     def all(klass):
@@ -0,0 +1,152 @@
+# vim: set fileencoding=utf-8 :
+
+import os
+import json
+import hashlib
+import tempfile
+
+class SegmentLog:
+    """Append-only log of the segments of a regulator BED file
+
+    Each segment is an (offset, length, sha1) triple of a block of complete
+    lines that was present when the log was last updated. Data appended to the
+    file later shows up as a new segment, so consumers can process just the
+    new records. Rewriting the file in any other way invalidates the log."""
+
+    def __init__(self, filename, segments=None):
+        self.filename = filename
+        self.segments = segments or []
+
+    @classmethod
+    def from_file(klass, filename):
+        log = klass(filename)
+        log.update()
+        return log
+
+    @property
+    def size(self):
+        """Number of bytes of the file covered by the log"""
+        if not self.segments:
+            return 0
+        offset, length, _ = self.segments[-1]
+        return offset + length
+
+    @property
+    def fingerprint(self):
+        """Identify the dataset version described by the log"""
+        digest = hashlib.sha1()
+        for _, _, segment_hash in self.segments:
+            digest.update(segment_hash)
+        return digest.hexdigest()
+
+    def read(self, segment):
+        """Read the data of a segment"""
+        offset, length, _ = segment
+        with open(self.filename, 'rb') as fh:
+            fh.seek(offset)
+            return fh.read(length)
+
+    def is_valid(self):
+        """Check if the file still starts with the logged data
+
+        Every logged segment is hashed again. This reads the logged part of
+        the file once, which is still much cheaper than recomputing results."""
+        if not os.path.isfile(self.filename):
+            return False
+        if os.path.getsize(self.filename) < self.size:
+            return False
+
+        with open(self.filename, 'rb') as fh:
+            for offset, length, segment_hash in self.segments:
+                fh.seek(offset)
+                if hashlib.sha1(fh.read(length)).hexdigest() != segment_hash:
+                    return False
+        return True
+
+    def update(self):
+        """Log data appended to the file since the last update
+
+        Returns the new segment, or None if no complete lines were appended.
+        Raises ValueError if the file was changed other than by appending."""
+        if not self.is_valid():
+            raise ValueError("Regulator file was modified: %s" % self.filename)
+
+        with open(self.filename, 'rb') as fh:
+            fh.seek(self.size)
+            data = fh.read()
+
+        # Only log complete lines, a writer might still be appending
+        end = data.rfind('\n') + 1
+        if end == 0:
+            return None
+
+        segment = (self.size, end, hashlib.sha1(data[:end]).hexdigest())
+        self.segments.append(segment)
+        return segment
+
+    def to_dict(self):
+        return {'file': self.filename,
+                'segments': [list(segment) for segment in self.segments]}
+
+    @classmethod
+    def from_dict(klass, data):
+        return klass(data['file'], [tuple(segment) for segment in data['segments']])
+
+
+class StoredResult:
+    """Result of a doRiNA analysis together with the data versions it used
+
+    Besides the result itself, the genome features hit by each regulator set
+    are kept, so that Dorina.update() can extend the result when regulator
+    files grow instead of recomputing it."""
+
+    def __init__(self, query, result, logs, hits=None):
+        self.query = query
+        self.result = result
+        self.logs = logs
+        self.hits = hits
+
+    @property
+    def fingerprint(self):
+        """Identify the versions of all regulator datasets used"""
+        digest = hashlib.sha1()
+        for name in sorted(self.logs.keys()):
+            digest.update("%s:%s" % (name, self.logs[name].fingerprint))
+        return digest.hexdigest()
+
+    def save(self, basename):
+        """Save the result to <basename>.bed and its state to <basename>.json"""
+        bed_file = basename + '.bed'
+        # Results loaded from <basename> are backed by bed_file itself, and
+        # saveas() truncates its target before reading the source
+        if os.path.abspath(self.result.fn) != os.path.abspath(bed_file):
+            fd, tmp_name = tempfile.mkstemp(suffix='.tmp',
+                                            dir=os.path.dirname(os.path.abspath(bed_file)))
+            os.close(fd)
+            try:
+                self.result.saveas(tmp_name)
+                os.rename(tmp_name, bed_file)
+            except:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
+        state = {
+            'query': self.query,
+            'result': os.path.abspath(bed_file),
+            'logs': dict((name, log.to_dict()) for name, log in self.logs.items()),
+            'hits': self.hits,
+        }
+        with open(basename + '.json', 'w') as fh:
+            json.dump(state, fh)
+
+    @classmethod
+    def load(klass, basename):
+        """Load a result saved with StoredResult.save()"""
+        from pybedtools import BedTool
+
+        with open(basename + '.json', 'r') as fh:
+            state = json.load(fh)
+
+        logs = dict((name, SegmentLog.from_dict(log))
+                    for name, log in state['logs'].items())
+        return klass(state['query'], BedTool(state['result']), logs, state['hits'])
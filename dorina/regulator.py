@@ -1,21 +1,22 @@
 import os
 import json
-from pybedtools import BedTool
 from dorina.utils import DorinaUtils
+from dorina.cache import BedCache
+from dorina.bins import BinIndex
 
 class Regulator:
     _datadir = None
     _regulators = None
 
-    def __init__(self, name, path, custom):
+    def __init__(self, name, path, custom, parse=True):
         self.name = name
         self.path = path
         self.basename = os.path.splitext(path)[0]
         self.custom = custom
-        self.bed = self._bed()
+        self.bed = self._bed() if parse else None
 
     @classmethod
-    def init(klass, datadir):
+    def init(klass, datadir, assembly=None):
         def parse_experiment(filename):
             experiment = {}
             with open(filename, 'r') as fh:
@@ -53,13 +54,22 @@ file as well as a BED file containing the data.
 
         klass._datadir = datadir
         klass._regulators = DorinaUtils.walk_assembly_tree(os.path.join(datadir, 'regulators'),
-                                                           parse_func)
+                                                           parse_func, assembly)
 
     @classmethod
     def all(klass):
         return klass._regulators
 
     def _bed(self):
+        if self.custom or not BedCache.enabled():
+            return self._parse_bed()
+
+        from pybedtools import BedTool
+        filename = BedCache.fetch('regulator:%s' % self.name, [self.path],
+                                  lambda tmp_name: self._parse_bed().saveas(tmp_name))
+        return BedTool(filename)
+
+    def _parse_bed(self, bt=None):
         def by_name(rec):
             # Drop first part before underscore.
             if "_" in self.name:
@@ -68,7 +78,9 @@ file as well as a BED file containing the data.
                 name = self.name
             return (name + "*" in rec.name) or (name == rec.name)
 
-        bt = BedTool(self.path)
+        from pybedtools import BedTool
+        if bt is None:
+            bt = BedTool(self.path)
         if not self.custom and '_all' not in self.name:
             bt = bt.filter(by_name).saveas()
 
@@ -77,33 +89,55 @@ file as well as a BED file containing the data.
 
         return bt
 
+    def occupancy(self):
+        """Get the coarse bin occupancy map of this regulator's sites
+
+        Maps of catalog regulators are kept in sidecar files next to their
+        BED file. Returns None if the map can't be stored."""
+        return BinIndex.stored('bins:regulator:%s' % self.name, self.path,
+                               lambda: BinIndex.from_file(self.bed.fn),
+                               sidecar=not self.custom)
+
+    def parse_segment(self, data):
+        """Get the records of this regulator in a chunk of its BED file"""
+        from pybedtools import BedTool
+        return self._parse_bed(BedTool(data, from_string=True))
+
     @staticmethod
     def merge(regulators):
         """Merge a list of regulators using BedTool.cat"""
+        from pybedtools import BedTool
         if len(regulators) > 1:
             return BedTool.cat(*regulators, postmerge=False)
         else:
             return regulators[0]
 
     @classmethod
-    def from_name(klass, name_or_path, assembly=None):
-        if os.sep in name_or_path:
-            return Regulator("custom", name_or_path, True)
+    def path_by_name(klass, name, assembly):
+        """Take a regulator name and return the path to its BED file
 
+        Only looks at the catalog, the BED file is not parsed."""
         if not assembly:
             raise ValueError("Must provide assembly")
 
         filename = None
         for species, species_dir in klass._regulators.items():
             for _assembly, assembly_dir in species_dir.items():
-                if assembly == _assembly and name_or_path in assembly_dir:
-                    basename = os.path.splitext(assembly_dir[name_or_path]['file'])[0]
+                if assembly == _assembly and name in assembly_dir:
+                    basename = os.path.splitext(assembly_dir[name]['file'])[0]
                     filename = basename + ".bed"
 
         if not filename or not os.path.isfile(filename):
-            raise ValueError("Could not find regulator: %s" % name_or_path)
+            raise ValueError("Could not find regulator: %s" % name)
+
+        return filename
+
+    @classmethod
+    def from_name(klass, name_or_path, assembly=None, parse=True):
+        if os.sep in name_or_path:
+            return Regulator("custom", name_or_path, True, parse)
 
-        return Regulator(name_or_path, filename, False)
+        return Regulator(name_or_path, klass.path_by_name(name_or_path, assembly), False, parse)
 
     @staticmethod
     def from_names(names, assembly):
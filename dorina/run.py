@@ -3,15 +3,24 @@
 import os
 import logging
 from os import path
-from pybedtools import BedTool
 
 from dorina.genome    import Genome
 from dorina.regulator import Regulator
+from dorina.cache     import BedCache
+from dorina.bins      import BinIndex
+from dorina.incremental import SegmentLog, StoredResult
 
 class Dorina:
-    def __init__(self, datadir):
-        Genome.init(datadir)
-        Regulator.init(datadir)
+    def __init__(self, datadir, cachedir=None, cache_max_size=None, assembly=None):
+        """Set up doRiNA for the data in <datadir>
+
+        If <assembly> is given, only the catalog of that assembly is loaded."""
+        Genome.init(datadir, assembly)
+        Regulator.init(datadir, assembly)
+        if cachedir:
+            BedCache.init(cachedir, cache_max_size)
+        else:
+            BedCache.disable()
 
     def analyse(self, genome,
                 set_a,      match_a='any', region_a='any',
@@ -20,13 +29,29 @@ class Dorina:
                 window_a=-1,
                 window_b=-1):
         """Run doRiNA analysis"""
+        return self._analyse(genome, set_a, match_a, region_a, set_b, match_b,
+                             region_b, combine, genes, window_a, window_b)[0]
+
+    def _analyse(self, genome, set_a, match_a, region_a, set_b, match_b,
+                 region_b, combine, genes, window_a, window_b):
+        """Run doRiNA analysis, return the result and the hits of set A and B"""
         logging.debug("analyse(%r, %r(%s) <-'%s'-> %r(%s))" % (genome, set_a, match_a, combine, set_b, match_b))
 
         def compute_result(region, regulators, match, window):
             genome_bed = self._get_genome_bedtool(genome, region, genes)
 
+            # Skip the intersections if the coarse bins can't overlap. With a
+            # window, only the initial regulator is compared to the genome.
+            if window > -1:
+                may_overlap = self._may_overlap(genome_bed, genes, regulators[:1], 'any')
+            else:
+                may_overlap = self._may_overlap(genome_bed, genes, regulators, match)
+            if not may_overlap:
+                logging.debug("no bins shared with the %s region, skipping" % region)
+                return None
+
             # create local copy so we can mangle it
-            _regulators = regulators[:]
+            _regulators = [regulator.bed for regulator in regulators]
             if window > -1:
                 initial = _regulators.pop(0)
                 genome_bed = genome_bed.intersect(initial)
@@ -42,29 +67,203 @@ class Dorina:
                 result = None
             return result
 
-        regulators_a = Regulator.from_names(set_a, assembly=genome)
-        regulators_b = Regulator.from_names(set_b, assembly=genome)
-        all_regulators = Regulator.merge(regulators_a + regulators_b)
+        regulators_a = [Regulator.from_name(name, genome) for name in set_a or []]
+        regulators_b = [Regulator.from_name(name, genome) for name in set_b or []]
+        all_regulators = Regulator.merge([regulator.bed for regulator in
+                                          regulators_a + regulators_b])
 
+        # Results skipped by the bin prefilter are None, i.e. empty
         result_a = compute_result(region_a, regulators_a, match_a, window_a)
 
         # Combine with set B, if exists
+        result_b = None
         if set_b:
             result_b = compute_result(region_b, regulators_b, match_b, window_b)
             if combine == 'or':
-                combined = Regulator.merge([result_a, result_b])
+                results = [r for r in (result_a, result_b) if r is not None]
+                combined = Regulator.merge(results) if results else None
             elif combine == 'and':
-                combined = result_a.intersect(result_b, wa=True, u=True)
+                if result_a is None or result_b is None:
+                    combined = None
+                else:
+                    combined = result_a.intersect(result_b, wa=True, u=True)
             elif combine == 'xor':
-                not_in_b = result_a.intersect(result_b, v=True, wa=True)
-                not_in_a = result_b.intersect(result_a, v=True, wa=True)
-                combined = Regulator.merge([not_in_b, not_in_a])
+                if result_a is None or result_b is None:
+                    combined = result_b if result_a is None else result_a
+                else:
+                    not_in_b = result_a.intersect(result_b, v=True, wa=True)
+                    not_in_a = result_b.intersect(result_a, v=True, wa=True)
+                    combined = Regulator.merge([not_in_b, not_in_a])
             elif combine == 'not':
-                combined = result_a.intersect(result_b, v=True, wa=True)
+                if result_a is None or result_b is None:
+                    combined = result_a
+                else:
+                    combined = result_a.intersect(result_b, v=True, wa=True)
         else:
             combined = result_a
 
-        return combined.intersect(all_regulators, wa=True, wb=True)
+        if combined is None:
+            from pybedtools import BedTool
+            return BedTool('', from_string=True), result_a, result_b
+
+        return combined.intersect(all_regulators, wa=True, wb=True), result_a, result_b
+
+    def _genome_occupancy(self, genome_bed, genes=None):
+        """Get the bin occupancy map of a genome region track
+
+        Returns None if the map can't be stored."""
+        if genes is None or 'all' in genes:
+            return BinIndex.stored('bins:genome', genome_bed.fn,
+                                   lambda: BinIndex.from_file(genome_bed.fn, gff=True),
+                                   sidecar=True)
+        # Gene-filtered tracks are small and query specific, don't keep them
+        return BinIndex.from_file(genome_bed.fn, gff=True)
+
+    def _may_overlap(self, genome_bed, genes, regulators, match):
+        """Check if the regulators share bins with the genome region track
+
+        For 'any', one of the regulators needs to share a bin, for 'all' every
+        one of them does. If any occupancy map isn't available, the check is
+        skipped and the regulators may overlap."""
+        maps = [regulator.occupancy() for regulator in regulators]
+        if None in maps:
+            return True
+        occupancy = self._genome_occupancy(genome_bed, genes)
+        if occupancy is None:
+            return True
+
+        if match == 'all':
+            return all(not (occupancy & m).is_empty() for m in maps)
+        return not (occupancy & reduce(lambda acc, m: acc | m, maps)).is_empty()
+
+    def analyse_versioned(self, genome,
+                          set_a,      match_a='any', region_a='any',
+                          set_b=None, match_b='any', region_b='any',
+                          combine='or', genes=None,
+                          window_a=-1,
+                          window_b=-1):
+        """Run doRiNA analysis, keeping track of the regulator versions used
+
+        Returns a StoredResult that can be brought up to date with update()
+        after regulator files were appended to. Regulator files must not be
+        appended to while the analysis is running."""
+        query = dict(genome=genome,
+                     set_a=set_a, match_a=match_a, region_a=region_a,
+                     set_b=set_b, match_b=match_b, region_b=region_b,
+                     combine=combine, genes=genes,
+                     window_a=window_a, window_b=window_b)
+
+        logs = {}
+        for name in (set_a or []) + (set_b or []):
+            regulator = Regulator.from_name(name, genome, parse=False)
+            logs[name] = SegmentLog.from_file(regulator.path)
+
+        result, result_a, result_b = self._analyse(**query)
+
+        hits = None
+        if self._is_incremental(query):
+            hits = {'a': self._feature_lines(result_a),
+                    'b': self._feature_lines(result_b)}
+
+        return StoredResult(query, result, logs, hits)
+
+    def update(self, stored):
+        """Bring a StoredResult up to date with the current regulator files
+
+        If regulator files were only appended to and the query is a union of
+        'any' matches, only the appended records are intersected and the new
+        rows are added to the stored result. Otherwise the analysis is rerun."""
+        query = stored.query
+        genome = query['genome']
+
+        try:
+            segments = {}
+            for name, log in stored.logs.items():
+                regulator = Regulator.from_name(name, genome, parse=False)
+                if regulator.path != log.filename:
+                    raise ValueError("Regulator %s moved to %s" % (name, regulator.path))
+                log = SegmentLog(log.filename, list(log.segments))
+                segments[name] = (regulator, log, log.update())
+        except ValueError, e:
+            logging.info("full recompute: %s" % e)
+            return self.analyse_versioned(**query)
+
+        if all(segment is None for _, _, segment in segments.values()):
+            return stored
+
+        if stored.hits is None or not self._is_incremental(query):
+            logging.info("full recompute: query can't be updated incrementally")
+            return self.analyse_versioned(**query)
+
+        def deltas(names):
+            beds = []
+            for name in names or []:
+                regulator, log, segment = segments[name]
+                if segment is not None:
+                    bed = regulator.parse_segment(log.read(segment))
+                    if len(bed) > 0:
+                        beds.append(bed)
+            return beds
+
+        def new_hits(region, delta, known):
+            if not delta:
+                return []
+            genome_bed = self._get_genome_bedtool(genome, region, query['genes'])
+            candidates = genome_bed.intersect(Regulator.merge(delta), wa=True, u=True)
+            known = set(known)
+            return [line for line in self._feature_lines(candidates) if line not in known]
+
+        delta_a = deltas(query['set_a'])
+        delta_b = deltas(query['set_b'])
+        new_a = new_hits(query['region_a'], delta_a, stored.hits['a'])
+        new_b = new_hits(query['region_b'], delta_b, stored.hits['b'])
+
+        # Features that were hit before pair up with the new regulator sites,
+        # newly hit features pair up with all regulator sites.
+        parts = [stored.result]
+        old_hits = stored.hits['a'] + stored.hits['b']
+        if old_hits and delta_a + delta_b:
+            parts.append(self._lines_to_bed(old_hits).intersect(
+                Regulator.merge(delta_a + delta_b), wa=True, wb=True))
+        if new_a + new_b:
+            all_regulators = Regulator.merge(
+                Regulator.from_names(query['set_a'], assembly=genome) +
+                Regulator.from_names(query['set_b'], assembly=genome))
+            parts.append(self._lines_to_bed(new_a + new_b).intersect(
+                all_regulators, wa=True, wb=True))
+
+        from pybedtools import BedTool
+        result = BedTool(feature for part in parts for feature in part).saveas()
+        hits = {'a': stored.hits['a'] + new_a,
+                'b': stored.hits['b'] + new_b}
+        logs = dict((name, log) for name, (_, log, _) in segments.items())
+
+        return StoredResult(query, result, logs, hits)
+
+    @staticmethod
+    def _is_incremental(query):
+        """Check if the result of a query can be extended with new regulator sites
+
+        This holds for unions: 'any' matches without windows, combined by 'or'."""
+        if query['match_a'] != 'any' or query['window_a'] > -1:
+            return False
+        if query['set_b']:
+            if query['combine'] != 'or':
+                return False
+            if query['match_b'] != 'any' or query['window_b'] > -1:
+                return False
+        return True
+
+    @staticmethod
+    def _feature_lines(bed):
+        if bed is None:
+            return []
+        return [str(feature).rstrip('\n') for feature in bed]
+
+    @staticmethod
+    def _lines_to_bed(lines):
+        from pybedtools import BedTool
+        return BedTool('\n'.join(lines) + '\n', from_string=True)
 
     def _add_slop(self, feature, genome_name, slop):
         """Add specified slop before and after a regulator"""
@@ -74,6 +273,8 @@ class Dorina:
 
     def _get_genome_bedtool(self, genome_name, region, genes=None):
         """get the bedtool object for a genome depending on the name and the region"""
+        from pybedtools import BedTool
+
         genome = Genome.path_by_name(genome_name)
         mapping = { "any":        "all",
                     "CDS":        "cds",
@@ -90,5 +291,12 @@ class Dorina:
         # Optionally, filter by gene.
         if genes is None or 'all' in genes:
             return bed
-        else:
+
+        if not BedCache.enabled():
             return bed.filter(lambda x: x.name in genes).saveas()
+
+        key = 'genome:%s:%s:%s' % (genome_name, region, ','.join(sorted(genes)))
+        filename = BedCache.fetch(key, [bed.fn],
+                                  lambda tmp_name: bed.filter(lambda x: x.name in genes).saveas(tmp_name),
+                                  suffix='.gff')
+        return BedTool(filename)
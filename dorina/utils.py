@@ -6,10 +6,11 @@ import json
 
 class DorinaUtils:
     @staticmethod
-    def walk_assembly_tree(root, parse_func):
+    def walk_assembly_tree(root, parse_func, assembly=None):
         """Walk a directory structure containg clade, species, assembly
 
-        Call parse_func() for every assembly directory"""
+        Call parse_func() for every assembly directory, or only for the
+        directories of <assembly> if given"""
         genomes = {}
 
         for species in os.listdir(root):
@@ -19,11 +20,16 @@ class DorinaUtils:
 
             species_dict = {}
 
-            for assembly in os.listdir(species_path):
-                assembly_path = os.path.join(species_path, assembly)
+            if assembly is None:
+                assemblies = os.listdir(species_path)
+            else:
+                assemblies = [assembly]
+
+            for _assembly in assemblies:
+                assembly_path = os.path.join(species_path, _assembly)
                 if not os.path.isdir(assembly_path):
                     continue
-                species_dict[assembly] = parse_func(assembly_path)
+                species_dict[_assembly] = parse_func(assembly_path)
 
             # Genomes have description files, regulators don't.
             description_file = os.path.join(species_path, 'description.json')
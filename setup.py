@@ -19,6 +19,7 @@ setup(
     url = "https://bioinf-redmine.age.mpg.de/projects/dorina-2",
     packages=['dorina', 'dorina.config'],
     install_requires=['Cython>=0.20.1', 'pybedtools>=0.6.4'],
+    extras_require={'arrow': ['pyarrow>=0.15,<0.17']},
     tests_require=['minimock','nose'],
     long_description=read('README.md'),
     classifiers=[
@@ -0,0 +1,119 @@
+# vim: set fileencoding=utf-8 :
+
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from dorina.bins import BinIndex
+from dorina.cache import BedCache
+
+datadir = path.join(path.dirname(path.abspath(__file__)), 'data')
+
+
+class TestBinIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        BedCache.disable()
+        BinIndex._indexes = {}
+        shutil.rmtree(self.tmpdir)
+
+    def test_add(self):
+        """Test BinIndex.add()"""
+        index = BinIndex()
+        index.add('chr1', 0, 10)
+        self.assertEqual({'chr1': 0b1}, index.bins)
+
+        # end is exclusive, so this stays in the first bin
+        index.add('chr1', 65530, 65536)
+        self.assertEqual({'chr1': 0b1}, index.bins)
+
+        index.add('chr1', 65530, 3 * 65536 + 1)
+        self.assertEqual({'chr1': 0b1111}, index.bins)
+
+        index.add('chr2', 5 * 65536, 5 * 65536)
+        self.assertEqual({'chr1': 0b1111, 'chr2': 0b100000}, index.bins)
+
+    def test_and_or(self):
+        """Test combining BinIndex objects"""
+        first = BinIndex({'chr1': 0b0110, 'chr2': 0b1})
+        second = BinIndex({'chr1': 0b1100, 'chr3': 0b1})
+
+        self.assertEqual({'chr1': 0b0100}, (first & second).bins)
+        self.assertEqual({'chr1': 0b1110, 'chr2': 0b1, 'chr3': 0b1},
+                         (first | second).bins)
+        self.assertTrue((first & BinIndex({'chr2': 0b10})).is_empty())
+        self.assertTrue(BinIndex().is_empty())
+
+    def test_from_file(self):
+        """Test BinIndex.from_file()"""
+        bedfile = path.join(datadir, 'regulators', 'h_sapiens', 'hg19', 'PARCLIP_scifi.bed')
+        self.assertEqual({'chr1': 0b1}, BinIndex.from_file(bedfile).bins)
+
+        gfffile = path.join(datadir, 'genomes', 'h_sapiens', 'hg19', 'all.gff')
+        self.assertEqual({'chr1': 0b1}, BinIndex.from_file(gfffile, gff=True).bins)
+
+    def test_dict(self):
+        """Test BinIndex.to_dict() and BinIndex.from_dict()"""
+        index = BinIndex({'chr1': 1 << 100 | 1, 'chrX': 0b101})
+        self.assertEqual(index.bins, BinIndex.from_dict(index.to_dict()).bins)
+
+    def build_func(self, filename):
+        self.builds = []
+
+        def build():
+            self.builds.append(True)
+            return BinIndex.from_file(filename)
+        return build
+
+    def test_stored_sidecar(self):
+        """Test BinIndex.stored() keeps each map in a sidecar file of its own"""
+        bedfile = path.join(self.tmpdir, 'manual.bed')
+        shutil.copy(path.join(datadir, 'manual.bed'), bedfile)
+        build = self.build_func(bedfile)
+
+        first = BinIndex.stored('bins:manual', bedfile, build, sidecar=True)
+        self.assertTrue(path.isfile(BinIndex.sidecar_path(bedfile, 'bins:manual')))
+        BinIndex._indexes = {}
+        second = BinIndex.stored('bins:manual', bedfile, build, sidecar=True)
+        self.assertEqual(1, len(self.builds))
+        self.assertEqual(first.bins, second.bins)
+
+        # other keys get their own sidecar
+        BinIndex.stored('bins:other', bedfile, build, sidecar=True)
+        self.assertNotEqual(BinIndex.sidecar_path(bedfile, 'bins:manual'),
+                            BinIndex.sidecar_path(bedfile, 'bins:other'))
+        self.assertTrue(path.isfile(BinIndex.sidecar_path(bedfile, 'bins:other')))
+        BinIndex._indexes = {}
+        BinIndex.stored('bins:manual', bedfile, build, sidecar=True)
+        BinIndex.stored('bins:other', bedfile, build, sidecar=True)
+        self.assertEqual(2, len(self.builds))
+
+        # a changed source invalidates the sidecar
+        with open(bedfile, 'a') as fh:
+            fh.write("chr2\t250\t260\tPARCLIP#manual*manual_chr2\t5\t+\t250\t260\n")
+        got = BinIndex.stored('bins:manual', bedfile, build, sidecar=True)
+        self.assertEqual(3, len(self.builds))
+        self.assertEqual({'chr1': 0b1, 'chr2': 0b1}, got.bins)
+
+    def test_stored_cache(self):
+        """Test BinIndex.stored() keeps maps in the BedCache without a sidecar"""
+        bedfile = path.join(datadir, 'manual.bed')
+        build = self.build_func(bedfile)
+
+        BedCache.init(path.join(self.tmpdir, 'cache'))
+        first = BinIndex.stored('bins:manual', bedfile, build)
+        BinIndex._indexes = {}
+        second = BinIndex.stored('bins:manual', bedfile, build)
+        self.assertEqual(1, len(self.builds))
+        self.assertEqual(first.bins, second.bins)
+
+    def test_stored_no_store(self):
+        """Test BinIndex.stored() doesn't build maps it can't keep"""
+        bedfile = path.join(datadir, 'manual.bed')
+        build = self.build_func(bedfile)
+
+        self.assertIsNone(BinIndex.stored('bins:manual', bedfile, build))
+        self.assertEqual([], self.builds)
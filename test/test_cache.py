@@ -0,0 +1,120 @@
+# vim: set fileencoding=utf-8 :
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from dorina.cache import BedCache
+
+
+class TestBedCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cachedir = path.join(self.tmpdir, 'cache')
+        self.source = path.join(self.tmpdir, 'source.bed')
+        with open(self.source, 'w') as fh:
+            fh.write("chr1\t250\t260\tsource\t5\t+\n")
+        self.builds = 0
+        BedCache.init(self.cachedir)
+
+    def tearDown(self):
+        BedCache.disable()
+        shutil.rmtree(self.tmpdir)
+
+    def build(self, filename):
+        self.builds += 1
+        with open(filename, 'w') as fh:
+            fh.write("x" * 100)
+
+    def test_init(self):
+        """Test BedCache.init()"""
+        self.assertTrue(path.isdir(self.cachedir))
+        self.assertTrue(BedCache.enabled())
+        BedCache.disable()
+        self.assertFalse(BedCache.enabled())
+
+    def test_fetch(self):
+        """Test BedCache.fetch() only builds an entry once"""
+        got = BedCache.fetch('key', [self.source], self.build)
+        self.assertEqual(1, self.builds)
+        self.assertTrue(path.isfile(got))
+        self.assertEqual(path.dirname(got), self.cachedir)
+
+        again = BedCache.fetch('key', [self.source], self.build)
+        self.assertEqual(got, again)
+        self.assertEqual(1, self.builds)
+
+        other = BedCache.fetch('other', [self.source], self.build)
+        self.assertNotEqual(got, other)
+        self.assertEqual(2, self.builds)
+
+    def test_fetch_source_changed(self):
+        """Test BedCache.fetch() rebuilds entries when the source changes"""
+        got = BedCache.fetch('key', [self.source], self.build)
+        with open(self.source, 'a') as fh:
+            fh.write("chr1\t1250\t1260\tsource\t5\t+\n")
+        again = BedCache.fetch('key', [self.source], self.build)
+        self.assertNotEqual(got, again)
+        self.assertEqual(2, self.builds)
+
+    def test_fetch_build_error(self):
+        """Test BedCache.fetch() leaves no partial entry on build errors"""
+        def broken(filename):
+            raise RuntimeError("build failed")
+
+        self.assertRaises(RuntimeError, BedCache.fetch, 'key', [self.source], broken)
+        self.assertEqual([], os.listdir(self.cachedir))
+
+    def test_evict(self):
+        """Test BedCache.evict() removes least recently used entries"""
+        BedCache.init(self.cachedir, max_size=250, grace_period=0)
+        first = BedCache.fetch('first', [self.source], self.build)
+        second = BedCache.fetch('second', [self.source], self.build)
+        now = time.time()
+        os.utime(first, (now - 20, now - 20))
+        os.utime(second, (now - 10, now - 10))
+
+        third = BedCache.fetch('third', [self.source], self.build)
+        self.assertFalse(path.exists(first))
+        self.assertTrue(path.exists(second))
+        self.assertTrue(path.exists(third))
+
+    def test_evict_grace_period(self):
+        """Test BedCache.evict() keeps recently used entries"""
+        BedCache.init(self.cachedir, max_size=150, grace_period=600)
+        first = BedCache.fetch('first', [self.source], self.build)
+        second = BedCache.fetch('second', [self.source], self.build)
+        self.assertTrue(path.exists(first))
+        self.assertTrue(path.exists(second))
+
+    def test_fetch_source_rewritten(self):
+        """Test BedCache.fetch() rebuilds entries of sources rewritten to the same size"""
+        # both versions of the file have an mtime within the same second
+        mtime = int(path.getmtime(self.source))
+        os.utime(self.source, (mtime + 0.25, mtime + 0.25))
+        got = BedCache.fetch('key', [self.source], self.build)
+        with open(self.source, 'w') as fh:
+            fh.write("chr1\t950\t960\tsource\t5\t+\n")
+        os.utime(self.source, (mtime + 0.5, mtime + 0.5))
+
+        again = BedCache.fetch('key', [self.source], self.build)
+        self.assertNotEqual(got, again)
+        self.assertEqual(2, self.builds)
+
+    def test_evict_stale_tmp(self):
+        """Test BedCache.evict() removes temporary files of failed builds"""
+        BedCache.init(self.cachedir, grace_period=60)
+        stale = path.join(self.cachedir, 'stale.tmp')
+        fresh = path.join(self.cachedir, 'fresh.tmp')
+        for filename in (stale, fresh):
+            with open(filename, 'w') as fh:
+                fh.write("x" * 100)
+        now = time.time()
+        os.utime(stale, (now - 120, now - 120))
+
+        BedCache.evict()
+        self.assertFalse(path.exists(stale))
+        self.assertTrue(path.exists(fresh))
@@ -0,0 +1,71 @@
+# vim: set fileencoding=utf-8 :
+
+import shutil
+import tempfile
+import unittest
+from os import path
+from pybedtools import BedTool
+
+from dorina import export
+from dorina.export import pa
+
+
+result_str = """chr1	doRiNA2	gene	1	1000	.	+	.	ID=gene01.01	chr1	250	260	PARCLIP#scifi*scifi_cds	5	+
+chr1	doRiNA2	gene	2001	3000	.	+	.	ID=gene01.02	chr1	2350	2360	PARCLIP#scifi*scifi_intron	5	+
+"""
+
+
+@unittest.skipIf(export.pa is None, "pyarrow not installed")
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.maxDiff = None
+        self.result = BedTool(result_str, from_string=True)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_to_arrow(self):
+        """Test export.to_arrow()"""
+        got = export.to_arrow(self.result)
+        self.assertEqual(2, got.num_rows)
+        self.assertEqual(export.schema(), got.schema)
+        self.assertEqual([1, 2001], got.column('genome_start').to_pylist())
+        self.assertEqual([None, None], got.column('genome_score').to_pylist())
+        self.assertEqual(['ID=gene01.01', 'ID=gene01.02'],
+                         got.column('genome_attributes').to_pylist())
+        self.assertEqual([250, 2350], got.column('regulator_start').to_pylist())
+        self.assertEqual([5.0, 5.0], got.column('regulator_score').to_pylist())
+
+    def test_record_batches(self):
+        """Test export.record_batches()"""
+        _, batches = export.record_batches(self.result, batch_size=1)
+        got = [batch.num_rows for batch in batches]
+        self.assertEqual([1, 1], got)
+
+    def test_record_batches_empty(self):
+        """Test export.record_batches() on an empty result"""
+        got_schema, batches = export.record_batches(BedTool('', from_string=True))
+        self.assertEqual(export.schema(), got_schema)
+        self.assertEqual([], list(batches))
+
+    def test_schema_invalid_width(self):
+        """Test export.schema() with an unexpected number of fields"""
+        self.assertRaises(ValueError, export.schema, 10)
+
+    def test_write_parquet(self):
+        """Test export.write_parquet()"""
+        import pyarrow.parquet as pq
+        filename = path.join(self.tmpdir, 'result.parquet')
+        export.write_parquet(self.result, filename, batch_size=1)
+        got = pq.ParquetFile(filename)
+        self.assertEqual(2, got.num_row_groups)
+        self.assertEqual(export.to_arrow(self.result), got.read())
+
+    def test_write_arrow(self):
+        """Test export.write_arrow()"""
+        filename = path.join(self.tmpdir, 'result.arrow')
+        export.write_arrow(self.result, filename, batch_size=1)
+        reader = pa.ipc.open_file(filename)
+        self.assertEqual(2, reader.num_record_batches)
+        self.assertEqual(export.to_arrow(self.result), reader.read_all())
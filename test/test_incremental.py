@@ -0,0 +1,208 @@
+# vim: set fileencoding=utf-8 :
+
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from dorina import run
+from dorina.genome    import Genome
+from dorina.regulator import Regulator
+from dorina.incremental import SegmentLog, StoredResult
+from dorina.bins      import BinIndex
+
+datadir = path.join(path.dirname(path.abspath(__file__)), 'data')
+
+
+class TestSegmentLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = path.join(self.tmpdir, 'regulator.bed')
+        with open(self.filename, 'w') as fh:
+            fh.write("chr1\t250\t260\tfirst\t5\t+\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def append(self, data):
+        with open(self.filename, 'a') as fh:
+            fh.write(data)
+
+    def test_update(self):
+        """Test SegmentLog.update()"""
+        log = SegmentLog.from_file(self.filename)
+        self.assertEqual(1, len(log.segments))
+        self.assertEqual(log.size, path.getsize(self.filename))
+        fingerprint = log.fingerprint
+
+        self.assertIsNone(log.update())
+        self.assertEqual(fingerprint, log.fingerprint)
+
+        self.append("chr1\t350\t360\tsecond\t5\t+\n")
+        segment = log.update()
+        self.assertEqual("chr1\t350\t360\tsecond\t5\t+\n", log.read(segment))
+        self.assertEqual(2, len(log.segments))
+        self.assertNotEqual(fingerprint, log.fingerprint)
+
+    def test_update_partial_line(self):
+        """Test SegmentLog.update() ignores incomplete lines"""
+        log = SegmentLog.from_file(self.filename)
+        self.append("chr1\t350\t360")
+        self.assertIsNone(log.update())
+
+        self.append("\tsecond\t5\t+\n")
+        segment = log.update()
+        self.assertEqual("chr1\t350\t360\tsecond\t5\t+\n", log.read(segment))
+
+    def test_update_modified(self):
+        """Test SegmentLog.update() on a rewritten file"""
+        log = SegmentLog.from_file(self.filename)
+        with open(self.filename, 'w') as fh:
+            fh.write("chr1\t950\t960\tother\t5\t+\n")
+        self.assertFalse(log.is_valid())
+        self.assertRaises(ValueError, log.update)
+
+    def test_update_modified_earlier_segment(self):
+        """Test SegmentLog.update() on a file with a modified earlier segment"""
+        log = SegmentLog.from_file(self.filename)
+        self.append("chr1\t350\t360\tsecond\t5\t+\n")
+        log.update()
+
+        with open(self.filename, 'r') as fh:
+            data = fh.read()
+        with open(self.filename, 'w') as fh:
+            fh.write(data.replace("250\t260", "950\t960"))
+        self.append("chr1\t450\t460\tthird\t5\t+\n")
+
+        self.assertFalse(log.is_valid())
+        self.assertRaises(ValueError, log.update)
+
+    def test_dict(self):
+        """Test SegmentLog.to_dict() and SegmentLog.from_dict()"""
+        log = SegmentLog.from_file(self.filename)
+        got = SegmentLog.from_dict(log.to_dict())
+        self.assertEqual(log.filename, got.filename)
+        self.assertEqual(log.segments, got.segments)
+
+
+class TestUpdate(unittest.TestCase):
+    def setUp(self):
+        self.maxDiff = None
+        self.tmpdir = tempfile.mkdtemp()
+        self.datadir = path.join(self.tmpdir, 'data')
+        shutil.copytree(datadir, self.datadir)
+        self.trees = (Genome._datadir, Genome._genomes,
+                      Regulator._datadir, Regulator._regulators)
+        self.run = run.Dorina(self.datadir)
+        self.bedfile = path.join(self.datadir, 'regulators', 'h_sapiens',
+                                 'hg19', 'PARCLIP_scifi.bed')
+
+    def tearDown(self):
+        (Genome._datadir, Genome._genomes,
+         Regulator._datadir, Regulator._regulators) = self.trees
+        BinIndex._indexes = {}
+        shutil.rmtree(self.tmpdir)
+
+    def append(self, data):
+        with open(self.bedfile, 'a') as fh:
+            fh.write(data)
+
+    def assertSameRows(self, expected, got):
+        self.assertEqual(sorted(str(expected).splitlines()),
+                         sorted(str(got).splitlines()))
+
+    def test_update_unchanged(self):
+        """Test run.update() without new regulator sites"""
+        stored = self.run.analyse_versioned('hg19', set_a=['PARCLIP_scifi'], region_a='CDS')
+        self.assertIs(stored, self.run.update(stored))
+
+    def test_update_appended(self):
+        """Test run.update() after regulator sites were appended"""
+        stored = self.run.analyse_versioned('hg19', set_a=['PARCLIP_scifi'], region_a='CDS')
+        self.append("chr1\t280\t290\tPARCLIP#scifi*scifi_cds2\t5\t+\t280\t290\n"
+                    "chr1\t2420\t2430\tPARCLIP#scifi*scifi_cds3\t5\t+\t2420\t2430\n")
+
+        got = self.run.update(stored)
+        self.assertIsNotNone(got.hits)
+        self.assertNotEqual(stored.fingerprint, got.fingerprint)
+        expected = self.run.analyse('hg19', set_a=['PARCLIP_scifi'], region_a='CDS')
+        self.assertSameRows(expected, got.result)
+
+    def test_update_or(self):
+        """Test run.update() on two sets combined by 'or'"""
+        query = dict(set_a=['PARCLIP_scifi'], region_a='CDS',
+                     set_b=['PICTAR_fake01'], region_b='intergenic', combine='or')
+        stored = self.run.analyse_versioned('hg19', **query)
+        self.append("chr1\t1500\t1510\tPARCLIP#scifi*scifi_intergenic2\t5\t.\t1500\t1510\n"
+                    "chr1\t2420\t2430\tPARCLIP#scifi*scifi_cds3\t5\t+\t2420\t2430\n")
+
+        got = self.run.update(stored)
+        expected = self.run.analyse('hg19', **query)
+        self.assertSameRows(expected, got.result)
+
+    def test_update_full_recompute(self):
+        """Test run.update() on queries that can't be updated incrementally"""
+        query = dict(set_a=['PARCLIP_scifi', 'PICTAR_fake01'], match_a='all')
+        stored = self.run.analyse_versioned('hg19', **query)
+        self.assertIsNone(stored.hits)
+        self.append("chr1\t2420\t2430\tPARCLIP#scifi*scifi_cds3\t5\t+\t2420\t2430\n")
+
+        got = self.run.update(stored)
+        expected = self.run.analyse('hg19', **query)
+        self.assertSameRows(expected, got.result)
+
+    def test_update_rewritten(self):
+        """Test run.update() after a regulator file was rewritten"""
+        stored = self.run.analyse_versioned('hg19', set_a=['PARCLIP_scifi'])
+        with open(self.bedfile, 'w') as fh:
+            fh.write("chr1\t2420\t2430\tPARCLIP#scifi*scifi_cds3\t5\t+\t2420\t2430\n")
+
+        got = self.run.update(stored)
+        expected = self.run.analyse('hg19', set_a=['PARCLIP_scifi'])
+        self.assertSameRows(expected, got.result)
+
+    def test_update_modified_earlier_segment(self):
+        """Test run.update() after an earlier segment of a regulator file was edited"""
+        stored = self.run.analyse_versioned('hg19', set_a=['PARCLIP_scifi'])
+        self.append("chr1\t280\t290\tPARCLIP#scifi*scifi_cds2\t5\t+\t280\t290\n")
+        stored = self.run.update(stored)
+        self.assertEqual(2, len(stored.logs['PARCLIP_scifi'].segments))
+
+        with open(self.bedfile, 'r') as fh:
+            data = fh.read()
+        with open(self.bedfile, 'w') as fh:
+            fh.write(data.replace("250\t260", "950\t960"))
+        self.append("chr1\t2420\t2430\tPARCLIP#scifi*scifi_cds3\t5\t+\t2420\t2430\n")
+
+        got = self.run.update(stored)
+        # a full recompute starts a new log
+        self.assertEqual(1, len(got.logs['PARCLIP_scifi'].segments))
+        expected = self.run.analyse('hg19', set_a=['PARCLIP_scifi'])
+        self.assertSameRows(expected, got.result)
+
+    def test_save_load(self):
+        """Test StoredResult.save() and StoredResult.load()"""
+        stored = self.run.analyse_versioned('hg19', set_a=['PARCLIP_scifi'])
+        basename = path.join(self.tmpdir, 'stored')
+        stored.save(basename)
+
+        got = StoredResult.load(basename)
+        self.assertEqual(stored.fingerprint, got.fingerprint)
+        self.assertEqual(stored.hits, got.hits)
+        self.assertSameRows(stored.result, got.result)
+
+    def test_save_load_same_basename(self):
+        """Test saving an unchanged loaded result to the basename it was loaded from"""
+        stored = self.run.analyse_versioned('hg19', set_a=['PARCLIP_scifi'])
+        basename = path.join(self.tmpdir, 'stored')
+        stored.save(basename)
+
+        loaded = StoredResult.load(basename)
+        updated = self.run.update(loaded)
+        self.assertIs(loaded, updated)
+        updated.save(basename)
+
+        got = StoredResult.load(basename)
+        self.assertNotEqual('', str(got.result))
+        self.assertSameRows(stored.result, got.result)
+        self.assertEqual(stored.hits, got.hits)
@@ -2,9 +2,12 @@
 
 import unittest
 import json
+import shutil
+import tempfile
 from os import path
 from dorina import utils
 from dorina.regulator import Regulator
+from dorina.cache import BedCache
 from pybedtools import BedTool
 
 datadir = path.join(path.dirname(path.abspath(__file__)), 'data')
@@ -88,3 +91,55 @@ class TestListDataWithoutOptions(unittest.TestCase):
         expected = BedTool(manual).bed6()
         got = Regulator.from_name(manual).bed
         self.assertEqual(expected, got)
+
+
+    def test_regulator_path_by_name(self):
+        """Test Regulator.path_by_name()"""
+        expected = path.join(datadir, 'regulators', 'h_sapiens', 'hg19', 'PICTAR_fake.bed')
+        got = Regulator.path_by_name("PICTAR_fake02", "hg19")
+        self.assertEqual(expected, got)
+
+        self.assertRaises(ValueError, Regulator.path_by_name, "invalid", "hg19")
+        self.assertRaises(ValueError, Regulator.path_by_name, "PICTAR_fake02", None)
+
+
+    def test_regulator_init_assembly(self):
+        """Test Regulator.init() restricted to a single assembly"""
+        try:
+            Regulator.init(datadir, 'hg18')
+            got = Regulator.all()
+            self.assertEqual(['hg18'], got['h_sapiens'].keys())
+            self.assertTrue('PICTAR_fake01' in got['h_sapiens']['hg18'])
+        finally:
+            Regulator.init(datadir)
+
+
+    def test_make_regulator_bed_cached(self):
+        """Test regulator.bed with the BedCache enabled"""
+        expected = Regulator.from_name("PICTAR_fake02", "hg19").bed
+
+        parse_bed = Regulator.__dict__['_parse_bed']
+        calls = []
+
+        def counting_parse_bed(self, *args):
+            calls.append(self.name)
+            return parse_bed(self, *args)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            BedCache.init(path.join(tmpdir, 'cache'))
+            Regulator._parse_bed = counting_parse_bed
+
+            got = Regulator.from_name("PICTAR_fake02", "hg19").bed
+            self.assertEqual(expected, got)
+            self.assertEqual(path.join(tmpdir, 'cache'), path.dirname(got.fn))
+            self.assertEqual(1, len(calls))
+
+            again = Regulator.from_name("PICTAR_fake02", "hg19").bed
+            self.assertEqual(got.fn, again.fn)
+            self.assertEqual(expected, again)
+            self.assertEqual(1, len(calls))
+        finally:
+            Regulator._parse_bed = parse_bed
+            BedCache.disable()
+            shutil.rmtree(tmpdir)
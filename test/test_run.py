@@ -1,19 +1,43 @@
 # vim: set fileencoding=utf-8 :
 
+import shutil
+import tempfile
 import unittest
 from os import path
 from argparse import Namespace
 from pybedtools import BedTool
+from minimock import mock, restore
 
 from dorina import config
-from dorina import run
+from dorina.run import Dorina
 from dorina.genome    import Genome
 from dorina.regulator import Regulator
-
-datadir = path.join(path.dirname(path.abspath(__file__)), 'data')
-run = run.Dorina(datadir)
-Genome.init(datadir)
-Regulator.init(datadir)
+from dorina.cache     import BedCache
+from dorina.bins      import BinIndex
+
+testdatadir = path.join(path.dirname(path.abspath(__file__)), 'data')
+tmpdir = None
+datadir = None
+run = None
+trees = None
+
+def setUpModule():
+    # Analyses store occupancy maps next to the data, so work on a copy
+    global tmpdir, datadir, run, trees
+    trees = (Genome._datadir, Genome._genomes,
+             Regulator._datadir, Regulator._regulators)
+    tmpdir = tempfile.mkdtemp()
+    datadir = path.join(tmpdir, 'data')
+    shutil.copytree(testdatadir, datadir)
+    run = Dorina(datadir)
+    Genome.init(datadir)
+    Regulator.init(datadir)
+
+def tearDownModule():
+    (Genome._datadir, Genome._genomes,
+     Regulator._datadir, Regulator._regulators) = trees
+    BinIndex._indexes = {}
+    shutil.rmtree(tmpdir)
 
 class TestAnalyseWithoutOptions(unittest.TestCase):
     def setUp(self):
@@ -182,3 +206,97 @@ chr1	doRiNA2	gene	1350	3360	.	+	.	ID=gene01.02	chr1	1350	1360	PICTAR#fake01*fake
                 lambda x: x.name == "gene01.02").saveas()
         got = run._get_genome_bedtool('hg19', 'any', genes=['gene01.02'])
         self.assertEqual(expected, got)
+
+
+class TestGenomeBedtoolCached(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cachedir = path.join(self.tmpdir, 'cache')
+        BedCache.init(self.cachedir)
+        self.filter = BedTool.__dict__['filter']
+        self.filter_calls = []
+
+        def counting_filter(bedtool, *args, **kwargs):
+            self.filter_calls.append(args)
+            return self.filter(bedtool, *args, **kwargs)
+        BedTool.filter = counting_filter
+
+    def tearDown(self):
+        BedTool.filter = self.filter
+        BedCache.disable()
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_genome_bedtool_cached(self):
+        """Test run._get_genome_bedtool() filtering by gene with the BedCache enabled"""
+        expected = BedTool(path.join(Genome.path_by_name('hg19'), 'all.gff')).filter(
+                lambda x: x.name == "gene01.02").saveas()
+        self.filter_calls = []
+
+        got = run._get_genome_bedtool('hg19', 'any', genes=['gene01.02'])
+        self.assertEqual(expected, got)
+        self.assertEqual(self.cachedir, path.dirname(got.fn))
+        self.assertEqual(1, len(self.filter_calls))
+
+        again = run._get_genome_bedtool('hg19', 'any', genes=['gene01.02'])
+        self.assertEqual(got.fn, again.fn)
+        self.assertEqual(expected, again)
+        self.assertEqual(1, len(self.filter_calls))
+
+    def test_init_without_cache(self):
+        """Test creating a Dorina object without a cache disables the BedCache"""
+        Dorina(datadir, self.cachedir)
+        self.assertTrue(BedCache.enabled())
+        Dorina(datadir)
+        self.assertFalse(BedCache.enabled())
+
+
+class TestAnalyseBinPrefilter(unittest.TestCase):
+    def setUp(self):
+        self.maxDiff = None
+        self.tmpdir = tempfile.mkdtemp()
+        self.chr2 = path.join(self.tmpdir, 'chr2.bed')
+        with open(self.chr2, 'w') as fh:
+            fh.write("chr2\t250\t260\tPARCLIP#chr2*chr2_cds\t5\t+\n")
+        # maps of custom regulators are only kept in the cache
+        BedCache.init(path.join(self.tmpdir, 'cache'))
+
+    def tearDown(self):
+        restore()
+        BedCache.disable()
+        BinIndex._indexes = {}
+        shutil.rmtree(self.tmpdir)
+
+    def test_analyse_no_shared_bins(self):
+        """Test run.analyse() with a regulator on a chromosome without genome features"""
+        # Build the occupancy maps, then make sure no intersection runs
+        Regulator.from_name('PARCLIP_scifi', 'hg19').occupancy()
+        Regulator.from_name(self.chr2).occupancy()
+        mock('BedTool.intersect', raises=AssertionError("intersect called"), tracker=None)
+
+        got = run.analyse('hg19', set_a=[self.chr2])
+        self.assertEqual('', str(got))
+
+        got = run.analyse('hg19', set_a=['PARCLIP_scifi', self.chr2], match_a='all')
+        self.assertEqual('', str(got))
+
+    def test_analyse_no_store(self):
+        """Test run.analyse() runs the intersections if maps can't be stored"""
+        BedCache.disable()
+        mock('BedTool.intersect', raises=AssertionError("intersect called"), tracker=None)
+        self.assertRaises(AssertionError, run.analyse, 'hg19', set_a=[self.chr2])
+
+    def test_analyse_no_shared_bins_combined(self):
+        """Test run.analyse() combining with a set that has no shared bins"""
+        expected = run.analyse('hg19', set_a=['PICTAR_fake01'])
+
+        got = run.analyse('hg19', set_a=[self.chr2], set_b=['PICTAR_fake01'], combine='or')
+        self.assertMultiLineEqual(str(expected), str(got))
+
+        got = run.analyse('hg19', set_a=[self.chr2], set_b=['PICTAR_fake01'], combine='xor')
+        self.assertMultiLineEqual(str(expected), str(got))
+
+        got = run.analyse('hg19', set_a=['PICTAR_fake01'], set_b=[self.chr2], combine='not')
+        self.assertMultiLineEqual(str(expected), str(got))
+
+        got = run.analyse('hg19', set_a=['PICTAR_fake01'], set_b=[self.chr2], combine='and')
+        self.assertEqual('', str(got))